@@ -6,10 +6,35 @@ group and order the links using a JSON definition file.
 
 More info at https://github.com/jeffjl74/github-sidebar
 """
+from __future__ import annotations
+
 import argparse
+import io
 import json
 import os
 import re
+import string
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+
+# pattern used on non-ASCII headings, compiled once
+_ANCHOR_RE = re.compile(r'[^\w\s-]')
+
+# ASCII headings: one translate() pass drops the characters _ANCHOR_RE would remove
+# (punctuation other than - and _, and non-whitespace control characters) and lowercases
+_ANCHOR_TABLE = {ord(c): None for c in string.punctuation if c not in '-_'}
+_ANCHOR_TABLE.update((i, None) for i in [*range(32), 127] if not chr(i).isspace())
+_ANCHOR_TABLE.update((ord(c), ord(c.lower())) for c in string.ascii_uppercase)
+
+class _IndentTable(dict):
+    """ Indent strings by level, built once per level and then reused """
+    def __missing__(self, level):
+        spaces = self[level] = '  ' * level
+        return spaces
+
+# prebuilt for the usual heading depths, deeper levels are added on demand
+_INDENTS = _IndentTable((i, '  ' * i) for i in range(32))
 
 class SummaryInfo:
     """ Info for a collapsable sidebar heading link, and its subheadings links """
@@ -17,7 +42,7 @@ class SummaryInfo:
         self.summary_name = name
         self.default_group_name = 'Ungrouped'  # so we only need to spell this out in this one place
         self.group_name = self.default_group_name
-        self.subheads = []
+        self.buf = io.StringIO()  # the summary's sidebar lines, ready to write
 
 class SummaryMap:
     def __init__(self, file_name):
@@ -33,79 +58,123 @@ class SummaryMap:
         with open(file_name, 'r', encoding='utf-8') as deffile:
             self.defs = json.load(deffile)
 
-    def get_group_for_summary(self, summary_name):
-        """ Return the group for the given summary_name, or None if not found """
+        # reverse lookup of summary name -> group name.
+        # the first group listing a summary wins, same as a top-down search of defs.
+        self._summary_to_group = {}
         for key,val in self.defs.items():
             for secname in val:
-                if secname == summary_name:
-                    return key
-        return None
+                self._summary_to_group.setdefault(secname, key)
+
+    def get_group_for_summary(self, summary_name):
+        """ Return the group for the given summary_name, or None if not found """
+        return self._summary_to_group.get(summary_name)
     
     def get_summarys_for_group(self, group_name):
         """ Return the summary details for the given group_name, or None if not found """
         self.summarys = self.defs.get(group_name, None)
         return self.summarys
 
+@dataclass
+class Config:
+    """ Command line settings, set by process_args() """
+    directory_path: str = ''                # path for the input markdown files
+    base_url: str = ''                      # url for the github project wiki
+    output_file: str = ''                   # the output file name
+    summary_map: SummaryMap | None = None   # the optional summary-to-group map from the JSON file
+
 def urljoin(*args):
     """ join a list of arguments into a URL, fixing extra or missing / delimeters """
     trailing_slash = '/' if args[-1].endswith('/') else ''
     return "/".join([str(x).strip("/") for x in args]) + trailing_slash
 
-def first(iterable, default=None):
-  """ find the first matching item """
-  for item in iterable:
-    return item
-  return default
-
-def get_markdown_files(directory):
-    """Get a list of markdown files in the given directory."""
+def get_markdown_files(directory: str) -> list[str]:
+    """Get a sorted list of markdown files in the given directory, excluding any sidebar file."""
     markdown_files = []
-    for root, dirs, files in os.walk(directory):
-        for file in files:
-            if file.endswith('.md'):
-                markdown_files.append(os.path.join(root, file))
+    folders = [directory]
+    while folders:
+        try:
+            entries = os.scandir(folders.pop())
+        except OSError:
+            continue  # unreadable folder, skip it like os.walk() does
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    folders.append(entry.path)
+                elif entry.is_file() and entry.name.endswith('.md') and "sidebar.md" not in entry.name.lower():
+                    # (is_file() follows links, so a linked folder named *.md is not taken as a file, as with os.walk())
+                    markdown_files.append(entry.path)
+    markdown_files.sort()
     return markdown_files
 
-def extract_headings(file_path):
+def extract_headings(file_path: str) -> tuple[str, list[tuple[int, str]]]:
     """
     Extract the main heading and subheadings from a markdown file.
     H1 heading will be the collapsable entry in the sidebar.
     H2 and up headings are shown when H1 is expanded.
     """
-    with open(file_path, 'r', encoding='utf-8') as file:
-        main_heading = None
-        subheadings = []
-        for line in file:
-            line = line.strip()
-            # how many (if any) #'s start the line?
-            m = re.search("^#+", line)
-            if m:
-                # indent level is "how many #'s"
-                indent = len(m.group())
-                if indent == 1:
-                    # H1 = main collapsable link
-                    main_heading = line[indent+1:]
-                elif indent > 1:
-                    # H2 & up = collapsed under H1
-                    # indent depth processed later
-                    offset = indent + 1 # to skip over the #'s and get the text
-                    subheadings.append((indent, line[offset:]))
-
-        # Default to filename if no main heading was found
-        if not main_heading:
-            main_heading = os.path.basename(file_path.replace('.md', ''))
-        
-        return main_heading, subheadings
-
-def create_anchor(text):
+    with open(file_path, 'rb') as file:
+        data = file.read()
+    # same line endings as a text mode read: \r\n and bare \r both end a line
+    if b'\r' in data:
+        data = data.replace(b'\r\n', b'\n').replace(b'\r', b'\n')
+
+    main_heading = None
+    subheadings = []
+    # jump from one '#' to the next rather than visiting every line,
+    # so the body text between headings is never split or copied.
+    # (headings can appear anywhere in the file, so the whole file is scanned.)
+    pos = data.find(b'#')
+    while pos >= 0:
+        start = data.rfind(b'\n', 0, pos) + 1
+        end = data.find(b'\n', pos)
+        if end < 0:
+            end = len(data)
+        # a heading has only whitespace, if anything, in front of the #.
+        # bytes.isspace() only knows ASCII whitespace, so decode anything else (e.g. a no-break space) to check it.
+        prefix = data[start:pos]
+        is_heading = not prefix or prefix.isspace() or prefix.decode('utf-8', 'replace').isspace()
+        pos = data.find(b'#', end)  # the next candidate is on a later line
+        if not is_heading:
+            continue
+
+        # only heading lines need to be decoded
+        line = data[start:end].strip().decode('utf-8').strip()
+        # indent level is "how many #'s start the line"
+        indent = len(line) - len(line.lstrip('#'))
+        if indent == 1:
+            # H1 = main collapsable link
+            main_heading = line[indent+1:]
+        elif indent > 1:
+            # H2 & up = collapsed under H1
+            # indent depth processed later
+            offset = indent + 1 # to skip over the #'s and get the text
+            subheadings.append((indent, line[offset:].strip()))
+
+    # Default to filename if no main heading was found
+    if not main_heading:
+        main_heading = os.path.basename(file_path.replace('.md', ''))
+    
+    return main_heading, subheadings
+
+@lru_cache(maxsize=4096)
+def create_anchor(text: str) -> str:
     """Create an anchor link for a heading text."""
     # Convert text to lowercase, replace spaces with hyphens, remove invalid URL characters
-    anchor = re.sub(r'[^\w\s-]', '', text).strip().lower().replace(' ', '-')
-    return anchor
+    if text.isascii():
+        anchor = text.translate(_ANCHOR_TABLE)
+    else:
+        anchor = _ANCHOR_RE.sub('', text).lower()
+    return anchor.strip().replace(' ', '-')
 
-def process_args():
+def process_args(argv=None):
     """
     Parses command line and verifies inputs
+
+    Args:
+        argv (list): The arguments to parse. Defaults to the program's command line.
+
+    Returns:
+        Config: The settings for generate_sidebar().
     """
     parser = argparse.ArgumentParser(description='Generate a Github Wiki sidebar from markdown files. Version 1.0.0',
              epilog='More info here: https://github.com/jeffjl74/github-sidebar')
@@ -117,143 +186,159 @@ def process_args():
                     action ='store', help ='Path to the folder of markdown files')
     parser.add_argument(dest ='reposName', 
                     action ='store', help ='Path to the github repository in the form user_name/repos_name')
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    cfg = Config()
 
-    global directory_path
-    directory_path = args.markdownFolder
-    if not os.path.isdir(directory_path):
-        parser.error('error: could not find input file directory: ' + directory_path)
+    cfg.directory_path = args.markdownFolder
+    if not os.path.isdir(cfg.directory_path):
+        parser.error('error: could not find input file directory: ' + cfg.directory_path)
 
-    global output_file
-    output_file = args.outputFile.strip()
+    cfg.output_file = args.outputFile.strip()
     try:
-        f = open(output_file, 'w', encoding='utf-8')
+        f = open(cfg.output_file, 'w', encoding='utf-8')
         f.close()
     except:
-        parser.error(f'could not open output file {output_file}')
+        parser.error(f'could not open output file {cfg.output_file}')
 
     # the base href= path on github to linked pages
     #  (Could not find a relative path that worked in both preview and live on github wiki,
     #   so just build the absolute path. This has the added benefit of testing using the local file.)
-    global base_url
-    base_url = urljoin('https://github.com/', args.reposName, '/wiki/')
+    cfg.base_url = urljoin('https://github.com/', args.reposName, '/wiki/')
 
-    global summary_map
     if args.summaryDef is not None:
         fname = args.summaryDef.strip()
         if not os.path.isfile(fname):
             print('error: Could not find json file ', fname, '. Files will not be grouped.')
         else:
             try:
-                summary_map = SummaryMap(fname)
+                cfg.summary_map = SummaryMap(fname)
             except json.JSONDecodeError as de:
                 print("Invalid JSON syntax: ", de)
 
-def generate_sidebar():
-    """Generate a sidebar markdown file with collapsible subheadings linking to their anchors."""
-    
-    global directory_path
-    global output_file
+    return cfg
+
+def generate_sidebar(cfg):
+    """
+    Generate a sidebar markdown file with collapsible subheadings linking to their anchors.
 
-    markdown_files = get_markdown_files(directory_path)
+    Args:
+        cfg (Config): The input folder, output file, and link settings, usually from process_args().
+    """
+    directory_path = cfg.directory_path
+    output_file = cfg.output_file
+    base_url = cfg.base_url
+    summary_map = cfg.summary_map
+
+    md_files = get_markdown_files(directory_path)
     summary_list = []
 
-    for md_file in sorted(markdown_files):
+    # reading the files is I/O bound, so read them in parallel.
+    # map() returns the results in input order, so the sidebar order is unchanged.
+    max_workers = min(32, (os.cpu_count() or 1) * 4)
+    with ThreadPoolExecutor(max_workers=max_workers) as ex:
+        headings = list(ex.map(extract_headings, md_files))
 
-        if "sidebar.md" in md_file.lower():
-            continue
+    # the file paths all start with the folder path joined the same way get_markdown_files() joined them,
+    # so the relative path for links is just what follows that prefix
+    prefix_len = len(os.path.join(directory_path, ''))
+
+    for md_file, (main_heading, subheadings) in zip(md_files, headings):
 
-        main_heading, subheadings = extract_headings(md_file)
-        relative_path = os.path.relpath(md_file, directory_path)  # Generate relative path for links
+        relative_path = md_file[prefix_len:]  # Generate relative path for links
 
         # gather each summmary separately, for later rearrangement
         summary = SummaryInfo(main_heading)
+        write = summary.buf.write
 
         # Main heading with link
-        relative_url = relative_path.replace('.md', '')
+        relative_url = relative_path[:-len('.md')]
         base_href = f'{base_url}{relative_url}'
-        summary.subheads.append(f'<details><summary><a href="{base_href}">{main_heading}</a></summary>')
+        write(f'<details><summary><a href="{base_href}">{main_heading}</a></summary>\n')
 
         if not subheadings:
             # end details
-            summary.subheads.append(f'</details>')
-            summary.subheads.append(f'\n')
+            write('</details>\n\n')
 
         if subheadings:
             # Add collapsible subheadings with links under the main heading
-            summary.subheads.append(f'  <ul>')
+            write(f'  <ul>\n')
             prior_indent = 2 # start at H2
-            spaces = '  '  * prior_indent  # for readability of the .md - has no effect on the rendered sidebar
-            for indent_level, subheading_anchor in subheadings:
-                anchor = create_anchor(subheading_anchor.strip())
+            spaces = _INDENTS[prior_indent]  # for readability of the .md - has no effect on the rendered sidebar
+            for indent_level, subheading in subheadings:
+                anchor = create_anchor(subheading)
                 # If the subheading is indented (H3 and up), adjust the indent in the .md
                 if  indent_level > prior_indent:
-                    spaces = '  ' * indent_level
-                    summary.subheads.append(f'{spaces}<ul>')
+                    spaces = _INDENTS[indent_level]
+                    write(f'{spaces}<ul>\n')
                     prior_indent = indent_level
-                    spaces = '  ' * (indent_level + 1)
+                    spaces = _INDENTS[indent_level + 1]
                 elif indent_level < prior_indent:
                     for count in range(prior_indent, indent_level, -1):
-                        spaces = '  ' * count
-                        summary.subheads.append(f'{spaces}</ul>')
+                        spaces = _INDENTS[count]
+                        write(f'{spaces}</ul>\n')
                     prior_indent = indent_level
-                    spaces = '  ' * indent_level
+                    spaces = _INDENTS[indent_level]
 
-                link = f'{base_href}#{anchor}'
-                summary.subheads.append(f'{spaces}<li><a href="{link}">{subheading_anchor.strip()}</a></li>')
+                write(''.join((spaces, '<li><a href="', base_href, '#', anchor, '">', subheading, '</a></li>\n')))
 
             for count in range(indent_level, 1, -1):
-                spaces = '  ' * (count - 1)
-                summary.subheads.append(f'{spaces}</ul>')
-            summary.subheads.append(f'</details>')
-            summary.subheads.append(f'\n')
-            
+                spaces = _INDENTS[count - 1]
+                write(f'{spaces}</ul>\n')
+            write('</details>\n\n')
+
         summary_list.append(summary)
 
+    # collect the output text, then write it all at once
+    out = []
+
     # if we have a summary map, arrange summarys into their group
     if summary_map is not None:
-        with open(output_file, 'w', encoding='utf-8') as sidebar:
-
-            # add the group name to the summarys
-            for s in summary_list:
-                group_name = summary_map.get_group_for_summary(s.summary_name)
-                if group_name is not None:
-                    s.group_name = group_name
-
-            # write the data in the json order
-            for group in summary_map.defs:
-                summarys = summary_map.get_summarys_for_group(group)
-                if summarys is None:
-                    continue
-                sidebar.write(f'## {group}\n')
-                for index, item in enumerate(summarys):
-                    sec = first(x for x in summary_list if x.summary_name == item)
-                    if sec is not None:
-                        sidebar.write('\n'.join(sec.subheads))
-
-            # add a group for the summarys that didn't get a group name
-            ungrouped_header_done = False
-            for s in summary_list:
-                if s.group_name == s.default_group_name:
-                    if not ungrouped_header_done:
-                        sidebar.write(f'## {s.group_name}\n')
-                        ungrouped_header_done = True
-                    sidebar.write('\n'.join(s.subheads))
+        # index summarys by name, keeping the first one in sorted file order for duplicate names
+        by_name = {}
+        for s in summary_list:
+            by_name.setdefault(s.summary_name, s)
+
+        # add the group name to the summarys
+        for s in summary_list:
+            group_name = summary_map.get_group_for_summary(s.summary_name)
+            if group_name is not None:
+                s.group_name = group_name
+
+        # write the data in the json order
+        for group in summary_map.defs:
+            summarys = summary_map.get_summarys_for_group(group)
+            if summarys is None:
+                continue
+            out.append(f'## {group}\n')
+            for index, item in enumerate(summarys):
+                sec = by_name.get(item)
+                if sec is not None:
+                    out.append(sec.buf.getvalue())
+
+        # add a group for the summarys that didn't get a group name
+        ungrouped_header_done = False
+        for s in summary_list:
+            if s.group_name == s.default_group_name:
+                if not ungrouped_header_done:
+                    out.append(f'## {s.group_name}\n')
+                    ungrouped_header_done = True
+                out.append(s.buf.getvalue())
 
     else: # no summary map
         # just write the data to the output file in sorted input file order
-        with open(output_file, 'w', encoding='utf-8') as sidebar:
-            for s in summary_list:
-                sidebar.write('\n'.join(s.subheads))
+        for s in summary_list:
+            out.append(s.buf.getvalue())
+
+    # encode once and write the bytes directly.
+    # (text mode would have translated newlines for the platform, so keep doing that)
+    content = ''.join(out)
+    if os.linesep != '\n':
+        content = content.replace('\n', os.linesep)
+    with open(output_file, 'wb') as sidebar:
+        sidebar.write(content.encode('utf-8'))
     
     print(f"Sidebar generated: {output_file}")
 
 
-# command line arguments, set by process_args()
-directory_path = '' # path for the input markdown files
-base_url = ''       # url for the github project wiki
-output_file = ''    # the output file name
-summary_map = None  # the optional summary-to-group map from the JSON file
-
-process_args()
-generate_sidebar()
+if __name__ == '__main__':
+    generate_sidebar(process_args())